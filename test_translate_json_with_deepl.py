@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import translate_json_with_deepl
+from translate_json_with_deepl import JSONTranslatorDeepL, stream_translate_json_file
+
+"""
+Checks that the streaming JSON writer produces the same output as json.dumps.
+Runs in simulation mode, so no DeepL API key or network access is needed.
+
+Usage:
+python -m unittest test_translate_json_with_deepl
+"""
+
+DOCUMENTS = [
+    {},
+    {"empty_object": {}, "empty_array": [], "nested": [[], [[1, 2], {}], [{"a": []}]]},
+    {"scalars": [0, -1, 1.5, 1e16, 1e-07, True, False, None, "", "  "], "key \"quoted\" ü": {"n": 12345678901234567890}},
+    {"text": "Hello {{name}} & <b>", "list": ["a", "b", ["c", {"d": "e"}]], "number": 42},
+]
+
+class TranslateJsonStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.translator = JSONTranslatorDeepL("simulation", simulation=True, cache_file=None)   # Returns the source texts
+
+    def stream(self, data, indent, prefix=b""):
+        output = io.BytesIO()
+        raw = prefix + json.dumps(data, indent=indent).encode("utf-8")
+        self.translator.translate_json_stream(io.BytesIO(raw), output, indent)
+        return output.getvalue().decode("utf-8")
+
+    def test_output_matches_json_dumps(self):
+        for data in DOCUMENTS:
+            for indent in (0, 2, 4):
+                with self.subTest(data=data, indent=indent):
+                    self.assertEqual(self.stream(data, indent), json.dumps(data, ensure_ascii=False, indent=indent))
+
+    def test_output_matches_json_dumps_with_small_buffers(self):
+        with mock.patch.object(translate_json_with_deepl, "STREAMING_BUFFER_TEXTS", 1), \
+             mock.patch.object(translate_json_with_deepl, "STREAMING_BUFFER_SEGMENTS", 1):
+            for data in DOCUMENTS:
+                with self.subTest(data=data):
+                    self.assertEqual(self.stream(data, 2), json.dumps(data, ensure_ascii=False, indent=2))
+
+    def test_output_matches_json_dumps_with_byte_order_mark(self):
+        for data in DOCUMENTS:
+            with self.subTest(data=data):
+                self.assertEqual(self.stream(data, 2, translate_json_with_deepl.UTF8_BOM),
+                                 json.dumps(data, ensure_ascii=False, indent=2))
+
+    def test_failed_stream_keeps_existing_output_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            input_file = os.path.join(directory, "input.json")
+            output_file = os.path.join(directory, "output.json")
+            for invalid_json in (b'[1, 2]', b'{"a": "b", "c": '):
+                with self.subTest(invalid_json=invalid_json):
+                    with open(input_file, "wb") as f:
+                        f.write(invalid_json)
+                    with open(output_file, "wb") as f:
+                        f.write(b'{"a": "b"}')
+                    self.assertFalse(stream_translate_json_file(self.translator, input_file, output_file))
+                    with open(output_file, "rb") as f:
+                        self.assertEqual(f.read(), b'{"a": "b"}')
+                    self.assertEqual(sorted(os.listdir(directory)), ["input.json", "output.json"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,24 @@
 import deepl    # https://github.com/DeepLcom/deepl-python
+import copy
+import decimal
+import functools
+import hashlib
+import ijson    # https://github.com/ICRAR/ijson
 import json
+import math
+import orjson   # https://github.com/ijl/orjson
 import os
+import queue
+import random
 import sys
+import tempfile
 import re
+import sqlite3
+import threading
 import time
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape, unescape
 from dotenv import load_dotenv
 
 """
@@ -20,107 +34,374 @@ Usage:
 python translate_json_with_deepl.py my_folder EN
 """
 
+MAX_BATCH_TEXTS = 50            # Maximum number of texts per DeepL request
+MAX_BATCH_BYTES = 70 * 1024     # Maximum UTF-8 payload per DeepL request (API limit is 128 KiB)
+MAX_CONCURRENT_REQUESTS = 10    # DeepL recommends 10-15 concurrent requests at most
+REQUESTS_PER_SECOND = 40        # Average request rate, below DeepL's limit of about 50 requests per second
+REQUEST_BURST = 50              # Maximum number of requests sent at once after an idle period
+MAX_CONCURRENT_FILES = 8        # Number of JSON files translated at the same time
+PIPELINE_QUEUE_SIZE = 4         # Files buffered between the read, translate and write stages
+STREAMING_THRESHOLD = 10 * 1024 * 1024      # Files of this size or larger are translated while being parsed
+STREAMING_BUFFER_TEXTS = MAX_BATCH_TEXTS * MAX_CONCURRENT_REQUESTS   # Strings buffered before translating them
+STREAMING_BUFFER_SEGMENTS = 10000           # Output pieces (keys, values, brackets) buffered before writing them
+CACHE_FILE = "deepl_cache.sqlite"
+PROGRESS_INTERVAL = 0.05        # Minimum seconds between two refreshes of the status line
+CONTROL_CHARACTERS = str.maketrans("", "", "\r\n\t")
+IGNORE_TAG = "x"                # XML tag whose content DeepL leaves untranslated
+PLACEHOLDER_PATTERN = re.compile(r"\{\{.*?\}\}")    # Placeholders like {{name}}
+IGNORE_TAG_PATTERN = re.compile(rf"</?{IGNORE_TAG}>")
+LETTER_PATTERN = re.compile(r"[^\W\d_]")           # Any Unicode letter
+INDENT_PATTERN = re.compile(rb"^( +)\S", re.MULTILINE)   # Leading spaces of an indented JSON line
+UTF8_BOM = b"\xef\xbb\xbf"     # Byte order mark some editors write at the start of UTF-8 files
+
+class TranslationCache:
+    """ Persistent SQLite cache of translations keyed by source text, target language and context.
+        Errors after opening are reported once and disable the cache, so they never fail a translation """
+    def __init__(self, file_path=CACHE_FILE):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, translation TEXT, billed INT)")
+        self.connection.commit()
+        self.enabled = True
+        self._lock = threading.Lock()
+
+    def _disable(self, error):
+        """ Reports a cache error and continues without cache """
+        if self.enabled:
+            self.enabled = False
+            print(f"\n⚠️ Warning: Translation cache '{self.file_path}' failed, continuing without cache. {error}")
+
+    @staticmethod
+    def make_key(text, target_lang, context=None):
+        """ Returns the cache key of a source text for the given target language and context """
+        return hashlib.sha1(f"{text}\x00{target_lang.upper()}\x00{context or ''}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Returns the cached translation for the key or None """
+        with self._lock:
+            if not self.enabled:
+                return None
+            try:
+                row = self.connection.execute("SELECT translation FROM translations WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                self._disable(e)
+                return None
+        return row[0] if row else None
+
+    def put_many(self, entries):
+        """ Stores a list of (key, translation, billed characters) in a single transaction """
+        with self._lock:
+            if not self.enabled:
+                return
+            try:
+                with self.connection:
+                    self.connection.executemany("INSERT OR REPLACE INTO translations (key, translation, billed) VALUES (?, ?, ?)", entries)
+            except sqlite3.Error as e:
+                self._disable(e)
+
+    def close(self):
+        with self._lock:
+            try:
+                self.connection.close()
+            except sqlite3.Error as e:
+                self._disable(e)
+
+class TokenBucket:
+    """ Token bucket rate limiter allowing on average rate requests per second with bursts of up to capacity requests """
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """ Blocks until the given number of tokens is available and takes them """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)   # Refill
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
 class JSONTranslatorDeepL:
-    def __init__(self, api_key, simulation=False):
-        self.translator = deepl.Translator(api_key)
+    def __init__(self, api_key, simulation=False, max_concurrent_requests=MAX_CONCURRENT_REQUESTS, cache_file=CACHE_FILE, keep_memo=True,
+                 requests_per_second=REQUESTS_PER_SECOND):
+        self.translator = deepl.Translator(api_key, send_platform_info=False)
         self.simulation = simulation
+        self.keep_memo = keep_memo      # Keep memoized translations across translated dictionaries
+        self._memo = {}
+        self.cache = None
+        if cache_file and not simulation:
+            try:
+                self.cache = TranslationCache(cache_file)
+            except sqlite3.Error as e:
+                print(f"⚠️ Warning: Could not open translation cache '{cache_file}', translating without cache. {e}")
         self.total_char_count = 0
+        self.quota_exceeded = False
+        self.stop_requested = False                 # Set on Ctrl+C, remaining batches are not sent
+        self.max_concurrent_requests = max_concurrent_requests
+        self._request_slots = threading.Semaphore(max_concurrent_requests)
+        self._bucket = TokenBucket(requests_per_second, REQUEST_BURST)
+        self._lock = threading.Lock()
 
+    @functools.cached_property
     def supported_source_languages(self):
-        """ Returns the supported source languages from the DeepL API """
+        """ Returns the upper-cased codes of the supported source languages, requested once from the DeepL API """
         try:
             result = self.translator.get_source_languages()
-            return [lang.language for lang in result]
+            return frozenset(lang.code.upper() for lang in result)
         except deepl.exceptions.DeepLException as e:
             print(f"❌ Error: {e}")
             sys.exit(1)
 
     def is_supported_source_language(self, lang_code):
         """ Checks if the given language code is supported by DeepL """
-        return lang_code.upper() in self.supported_source_languages()
+        return lang_code.upper() in self.supported_source_languages
 
+    @functools.cached_property
     def supported_target_languages(self):
-        """ Returns the supported target languages from the DeepL API """
+        """ Returns the upper-cased codes of the supported target languages, requested once from the DeepL API """
         try:
             result = self.translator.get_target_languages()
-            return [lang.code for lang in result]
+            return frozenset(lang.code.upper() for lang in result)
         except deepl.exceptions.DeepLException as e:
             print(f"❌ Error: {e}")
             sys.exit(1)
 
     def is_supported_target_language(self, lang_code):
         """ Checks if the given language code is supported by DeepL """
-        return lang_code.upper() in self.supported_target_languages()
-
-    def replace_placeholders(self, text):
-        """ Replaces placeholders like {{name}} in the text with temporary tokens """
-        placeholders = re.findall(r"\{\{.*?\}\}", text)
-        temp_tokens = {ph: f"@@{i}@@" for i, ph in enumerate(placeholders)}
-        for ph, token in temp_tokens.items():
-            text = text.replace(ph, token)
-        return text, temp_tokens
-
-    def restore_placeholders(self, text, temp_tokens):
-        """ Resets the temporary tokens back to their original placeholders """
-        for ph, token in temp_tokens.items():
-            text = text.replace(token, ph)
-        return text
+        return lang_code.upper() in self.supported_target_languages
+
+    def wrap_placeholders(self, text):
+        """ Escapes the text for DeepL's XML tag handling and wraps placeholders like {{name}} in ignored <x> tags """
+        return PLACEHOLDER_PATTERN.sub(rf"<{IGNORE_TAG}>\g<0></{IGNORE_TAG}>", escape(text))
+
+    def unwrap_placeholders(self, text):
+        """ Removes the <x> tags around placeholders and unescapes the translated text """
+        return unescape(IGNORE_TAG_PATTERN.sub("", text))
 
     def count_words_and_phrases_in_dict(self, data):
-        """ Counts the number of phrases (= keys with string values) and words of the phrases in a JSON dictionary recursively """
+        """ Counts the number of phrases (= keys with string values) and words of the phrases in a JSON dictionary iteratively """
         phrase_count = 0
         word_count = 0
-        if isinstance(data, dict):
-            for value in data.values():
-                phrases, words = self.count_words_and_phrases_in_dict(value)
-                phrase_count += phrases
-                word_count += words
-        elif isinstance(data, list):
-            for item in data:
-                phrases, words = self.count_words_and_phrases_in_dict(item)
-                phrase_count += phrases
-                word_count += words
-        elif isinstance(data, str) and data.strip():
-            phrase_count += 1
-            word_count += len(data.split())
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(node)
+            elif isinstance(node, str) and node.strip():
+                phrase_count += 1
+                word_count += len(node.split())
         return phrase_count, word_count
 
-    def translate_dict(self, data, target_lang="EN", context=None):
-        """ Translates a JSON dictionary recursively using the DeepL API and counts translated characters """
+    def _collect_leaves(self, data, path=()):
+        """ Yields (path, text) for every non-empty string in a JSON dictionary, path being the tuple of keys/indices """
         if isinstance(data, dict):
-            return {key: self.translate_dict(value, target_lang, context) for key, value in data.items()}
+            for key, value in data.items():
+                yield from self._collect_leaves(value, path + (key,))
         elif isinstance(data, list):
-            return [self.translate_dict(item, target_lang, context) for item in data]
-        elif isinstance(data, str) and data.strip(): 
-            text_with_tokens, tokens = self.replace_placeholders(data)
-            if not self.simulation:
-                retry_attempts = 5
-                timeout = 1 # seconds
-                for attempt in range(retry_attempts):
-                    try:
-                        result = self.translator.translate_text(text_with_tokens, target_lang=target_lang, context=context)
-                        translated_text = result.text
-                        char_count = result.billed_characters
-                        self.total_char_count += char_count
-                        source_text = re.sub(r"[\r\n\t]", "", text_with_tokens)
-                        target_text = re.sub(r"[\r\n\t]", "", translated_text)
-                        print(f"\r {shorten_text(source_text, 50).rjust(50)} → {shorten_text(target_text, 50).ljust(50)}", end="", flush=True)
-                        return self.restore_placeholders(translated_text, tokens)
-                    except deepl.exceptions.DeepLException as e:
-                        print(f"\n❌ Error at DeepL translation: {e}")
-                        if attempt < retry_attempts - 1:
-                            print(f"🔄 Retrying...in {timeout} second")
-                            time.sleep(timeout)             # Wait before retrying
-                            timeout = min(timeout * 5, 60)  # Exponential backoff
-                        else:
-                            print("❌ Error: Maximum retry attempts reached.")
-                            return data
+            for index, item in enumerate(data):
+                yield from self._collect_leaves(item, path + (index,))
+        elif isinstance(data, str) and data.strip():
+            yield path, data
+
+    def _assign_leaves(self, data, path, value):
+        """ Sets the value at the given path (tuple of keys/indices) in a JSON dictionary """
+        for key in path[:-1]:
+            data = data[key]
+        data[path[-1]] = value
+
+    def _reduce_concurrency(self):
+        """ Lowers the number of concurrent requests by one (minimum 1), returns True if the limit was lowered """
+        with self._lock:
+            if self.max_concurrent_requests > 1:
+                self.max_concurrent_requests -= 1
+                return True
+            return False
+
+    def _send_request(self, texts, target_lang, context):
+        """ Sends a single rate limited translation request while holding one of the concurrent request slots """
+        keep_slot = False
+        self._request_slots.acquire()
+        try:
+            self._bucket.acquire()                  # Taken with the slot so queued requests don't burst past the rate
+            return self.translator.translate_text(texts, target_lang=target_lang, context=context,
+                                                  tag_handling="xml", ignore_tags=[IGNORE_TAG])
+        except deepl.exceptions.TooManyRequestsException:
+            keep_slot = self._reduce_concurrency()  # Never release the slot to adaptively lower the concurrency
+            raise
+        finally:
+            if not keep_slot:
+                self._request_slots.release()
+
+    def translate_batch(self, texts, target_lang="EN", context=None):
+        """ Translates a list of texts with a single DeepL request and returns (translation, billed characters) in the same order or None on failure """
+        if self.simulation:
+            if progress_due():                      # Deactivate translation for testing
+                print_progress(self.unwrap_placeholders(texts[-1]), self.unwrap_placeholders(texts[-1]))
+            return [(text, 0) for text in texts]
+        retry_attempts = 5
+        for attempt in range(retry_attempts):
+            if self.quota_exceeded or self.stop_requested:
+                return None
+            try:
+                results = self._send_request(texts, target_lang, context)
+                with self._lock:
+                    self.total_char_count += sum(result.billed_characters for result in results)
+                if progress_due():
+                    print_progress(self.unwrap_placeholders(texts[-1]), self.unwrap_placeholders(results[-1].text))
+                return [(result.text, result.billed_characters) for result in results]
+            except deepl.exceptions.QuotaExceededException as e:
+                print(f"\n❌ Error: DeepL quota exceeded, no further requests are sent. {e}")
+                self.quota_exceeded = True          # Retrying is pointless until the quota is reset
+                return None
+            except deepl.exceptions.DeepLException as e:
+                print(f"\n❌ Error at DeepL translation: {e}")
+                if attempt < retry_attempts - 1:
+                    timeout = backoff_delay(attempt)
+                    print(f"🔄 Retrying...in {timeout:.1f} seconds")
+                    time.sleep(timeout)             # Wait before retrying
+                else:
+                    print("❌ Error: Maximum retry attempts reached.")
+        return None
+
+    def translate_texts(self, texts, target_lang="EN", context=None, memoize=True, stats=None):
+        """ Translates a list of texts in concurrently sent batches and returns the translations in the same order, using memoized and cached translations where available.
+            With memoize=False new translations are not added to the in-memory memo, a given stats dictionary counts the failed texts """
+        translated_texts = [None] * len(texts)
+        pending = {}                                # Unique texts to be sent to DeepL with their indices
+        for index, text in enumerate(texts):
+            memoized = self._memo.get((text, target_lang, context))
+            if memoized is not None:
+                translated_texts[index] = memoized
+            else:
+                pending.setdefault(text, []).append(index)
+
+        if self.cache:
+            for text in list(pending):
+                cached = self.cache.get(TranslationCache.make_key(text, target_lang, context))
+                if cached is not None:
+                    if memoize:
+                        self._memo[(text, target_lang, context)] = cached
+                    for index in pending.pop(text):
+                        translated_texts[index] = cached
+
+        batches = list(split_into_batches(list(pending)))
+        if not batches:
+            return translated_texts
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(batches))) as executor:
+            futures = [executor.submit(self.translate_batch, batch, target_lang, context) for batch in batches]
+
+        cache_entries = []
+        for batch, future in zip(batches, futures): # Futures are kept in batch order
+            results = future.result()
+            for position, text in enumerate(batch):
+                if results is None:                 # Keep the source text if the translation failed
+                    translated_text = text
+                    if stats is not None:
+                        stats["failed"] = stats.get("failed", 0) + len(pending[text])
+                else:
+                    translated_text, billed = results[position]
+                    if memoize:
+                        self._memo[(text, target_lang, context)] = translated_text
+                    if self.cache:
+                        cache_entries.append((TranslationCache.make_key(text, target_lang, context), translated_text, billed))
+                for index in pending[text]:
+                    translated_texts[index] = translated_text
+        if cache_entries:
+            self.cache.put_many(cache_entries)      # One transaction per translated dictionary
+        return translated_texts
+
+    def _translate_leaf_texts(self, texts, target_lang="EN", context=None, stats=None, memoize=True):
+        """ Translates the non-empty strings of a JSON document, keeps untranslatable texts unchanged
+            and, if a stats dictionary is given, counts the translated phrases and words and the failed texts """
+        translatable = [index for index, text in enumerate(texts) if is_translatable(text)]
+        xml_texts = [self.wrap_placeholders(texts[index]) for index in translatable]
+
+        translated_texts = list(texts)              # Untranslatable texts are kept as they are
+        for index, translated_text in zip(translatable, self.translate_texts(xml_texts, target_lang, context, memoize, stats)):
+            translated_texts[index] = self.unwrap_placeholders(translated_text)
+
+        if stats is not None:
+            for translated_text in translated_texts:
+                if translated_text.strip():
+                    stats["phrases"] += 1
+                    stats["words"] += len(translated_text.split())
+        return translated_texts
+
+    def translate_dict(self, data, target_lang="EN", context=None, stats=None):
+        """ Translates a JSON dictionary (or any other JSON value) using batched DeepL requests and counts translated characters
+            and, if a stats dictionary is given, the translated phrases and words """
+        if not self.keep_memo:
+            self._memo.clear()
+        leaves = list(self._collect_leaves(data))
+        translated_texts = self._translate_leaf_texts([text for _, text in leaves], target_lang, context, stats)
+        if isinstance(data, str):                   # A single string has no path to assign it to
+            return translated_texts[0] if translated_texts else data
+
+        translated_data = copy.deepcopy(data)
+        for (path, _), translated_text in zip(leaves, translated_texts):
+            self._assign_leaves(translated_data, path, translated_text)
+        return translated_data
+
+    def translate_json_stream(self, input_stream, output_stream, indent=4, target_lang="EN", context=None, stats=None):
+        """ Translates a JSON object while it is parsed from a binary stream with ijson and writes the translation
+            incrementally to a binary stream. Output and strings are buffered up to STREAMING_BUFFER_SEGMENTS and
+            STREAMING_BUFFER_TEXTS and new translations are not memoized, so the memory use does not depend on the size of the JSON """
+        segments = []       # Output not written yet, None marks a string still to be translated
+        pending = []        # Strings still to be translated, in the order of the None segments
+        containers = []     # [is object, has items] for each open object or array
+
+        def flush():
+            translated_texts = iter(self._translate_leaf_texts(pending, target_lang, context, stats, memoize=False))
+            output = "".join(json.dumps(next(translated_texts), ensure_ascii=False) if segment is None else segment
+                             for segment in segments)
+            output_stream.write(output.encode("utf-8"))
+            segments.clear()
+            pending.clear()
+
+        def separator():
+            """ Returns the comma and line break with indentation in front of a key or an array item """
+            separator = ("," if containers[-1][1] else "") + "\n" + " " * (indent * len(containers))
+            containers[-1][1] = True
+            return separator
+
+        start = input_stream.tell()
+        if input_stream.read(len(UTF8_BOM)) != UTF8_BOM:     # ijson rejects a leading byte order mark
+            input_stream.seek(start)
+        for _, event, value in ijson.parse(input_stream):  # use_float=True would overflow on integers over 64 bit
+            if not containers and event != "start_map":
+                raise ValueError("The JSON does not contain a valid JSON object.")
+            if event == "map_key":
+                segments.append(separator() + json.dumps(value, ensure_ascii=False) + ": ")
+                continue
+            if event in ("end_map", "end_array"):
+                _, has_items = containers.pop()
+                closing = "}" if event == "end_map" else "]"
+                segments.append("\n" + " " * (indent * len(containers)) + closing if has_items else closing)
+                continue
+            prefix = separator() if containers and not containers[-1][0] else ""    # Array items need a separator
+            if event in ("start_map", "start_array"):
+                segments.append(prefix + ("{" if event == "start_map" else "["))
+                containers.append([event == "start_map", False])
+            elif event == "string" and value.strip():
+                segments.append(prefix)
+                segments.append(None)
+                pending.append(value)
             else:
-                translated_text = text_with_tokens  # Deactivate translation for testing
-                source_text = re.sub(r"[\r\n\t]", "", text_with_tokens)
-                target_text = re.sub(r"[\r\n\t]", "", translated_text)
-                print(f"\r {shorten_text(source_text, 50).rjust(50)} → {shorten_text(target_text, 50).ljust(50)}", end="", flush=True)
-        return data
+                if isinstance(value, decimal.Decimal):
+                    value = float(value)            # Same value and formatting as json.loads/json.dumps
+                segments.append(prefix + json.dumps(value, ensure_ascii=False))
+            if len(pending) >= STREAMING_BUFFER_TEXTS or len(segments) >= STREAMING_BUFFER_SEGMENTS:
+                flush()
+        flush()
 
 def get_api_key(env_variable="DEEPL_API_KEY"):
     try:
@@ -135,39 +416,155 @@ def get_api_key(env_variable="DEEPL_API_KEY"):
     else:
         return api_key
 
-def get_json_indentation(file_path):
-    """ Detects the indentation of a JSON file and returns the number of spaces used for indentation """
+def detect_json_indentation(raw):
+    """ Detects the indentation of already loaded JSON bytes and returns the number of spaces used for indentation (default 4) """
+    match = INDENT_PATTERN.search(raw)      # JSON indentation is uniform, the first indented line reveals it
+    return len(match.group(1)) if match else 4
+
+def is_translatable(text):
+    """ Checks if the text contains any letter outside of placeholders. Texts like "{{name}}", "42" or "%" are
+        returned unchanged by DeepL but would still be billed, so they are not sent for translation """
+    return LETTER_PATTERN.search(PLACEHOLDER_PATTERN.sub("", text)) is not None
+
+def load_json(raw):
+    """ Parses JSON bytes with orjson and falls back to the json module for input orjson rejects (e.g. NaN, BOM) """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-    except OSError as e:
-        print(f"❌ Error: Could not read file '{file_path}'. {e}")
-        return 4
-    except Exception as e:
-        print(f"❌ Error: An unexpected error occurred while reading '{file_path}'. {e}")
-        return 4
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)
 
-    indent_counts = []
-    
-    for line in lines:
-        match = re.match(r"^(\s+)", line)               # Checks for leading whitespace
-        if match:
-            indent_counts.append(len(match.group(1)))   # Length of leading whitespace
+def dump_json(data, indent=4):
+    """ Serializes data to UTF-8 JSON bytes with the json module, which keeps NaN/Infinity and formats numbers
+        the same for every indentation (orjson writes NaN as null and formats floats differently) """
+    return json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")
 
-    indent_value = min(set(indent_counts))              # Smallest indent value
-    return indent_value
+def pop_option(args, name):
+    """ Removes an option given as "--name value" or "--name=value" from the argument list and returns its value or None """
+    for index, arg in enumerate(args):
+        if arg == name:
+            if index + 1 >= len(args):
+                raise ValueError(f"Missing value for option '{name}'")
+            value = args[index + 1]
+            del args[index:index + 2]
+            return value
+        if arg.startswith(name + "="):
+            del args[index]
+            return arg[len(name) + 1:]
+    return None
 
 def shorten_text(text, max_length=15, placeholder="..."):
     return text[:max_length-len(placeholder)] + placeholder if len(text) > max_length else text
 
-def translate_json_directory(source_directory, target_lang="EN", context=None):
+def backoff_delay(attempt, base=1, maximum=60):
+    """ Returns the exponential backoff delay in seconds for a retry attempt with up to 50 % random jitter """
+    delay = min(base * 2 ** attempt, maximum)
+    return delay + random.uniform(0, delay / 2)    # Jitter keeps concurrent requests from retrying in lockstep
+
+def progress_due():
+    """ Returns True if the status line should be refreshed, i.e. on a terminal at most every PROGRESS_INTERVAL seconds """
+    global last_progress_time
+    now = time.monotonic()
+    if now - last_progress_time < PROGRESS_INTERVAL or not sys.stdout.isatty():
+        return False
+    last_progress_time = now
+    return True
+
+def print_progress(source_text, target_text):
+    """ Prints the last translated phrase in a single status line """
+    source_text = source_text.translate(CONTROL_CHARACTERS)
+    target_text = target_text.translate(CONTROL_CHARACTERS)
+    print(f"\r {shorten_text(source_text, 50).rjust(50)} → {shorten_text(target_text, 50).ljust(50)}", end="", flush=True)
+
+def split_into_batches(texts, max_texts=MAX_BATCH_TEXTS, max_bytes=MAX_BATCH_BYTES):
+    """ Splits a list of texts into batches limited by the number of texts and the UTF-8 payload size """
+    batch = []
+    batch_bytes = 0
+    for text in texts:
+        text_bytes = len(text.encode("utf-8"))
+        if batch and (len(batch) >= max_texts or batch_bytes + text_bytes > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(text)
+        batch_bytes += text_bytes
+    if batch:
+        yield batch
+
+def read_json_file(input_file, detect_indent=True):
+    """ Reads and parses a JSON file and returns (data, indentation) or None if the file was skipped,
+        the indentation is None if its detection is not requested """
+    try:
+        with open(input_file, "rb") as f:
+            raw = f.read()
+        data = load_json(raw)
+    except OSError as e:
+        print(f"❌ Error: Could not read file '{input_file}'. {e}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"❌ Error: Could not decode JSON in file '{input_file}'. {e}")
+        return None
+    except Exception as e:
+        print(f"❌ Error: An unexpected error occurred while reading '{input_file}'. {e}")
+        return None
+    if not isinstance(data, dict):
+        print(f"❌ Error: The file '{input_file}' does not contain a valid JSON object.")
+        return None
+    return data, detect_json_indentation(raw) if detect_indent else None
+
+def write_json_file(output_file, data, indent=4):
+    """ Writes data to a JSON file and returns True on success """
+    try:
+        with open(output_file, "wb") as f:
+            f.write(dump_json(data, indent))
+    except OSError as e:
+        print(f"❌ Error: Could not write to file '{output_file}'. {e}")
+        return False
+    return True
+
+def stream_translate_json_file(translator, input_file, output_file, target_lang="EN", context=None, stats=None):
+    """ Translates a large JSON file while parsing it and returns True on success. The translation is written to a
+        temporary file that replaces the output file only on success, output_file None discards the translation """
+    temp_file = None
+    stats = {"phrases": 0, "words": 0, "failed": 0} if stats is None else stats
+    try:
+        with open(input_file, "rb") as f:
+            indent = detect_json_indentation(f.read(64 * 1024))   # The first indented line is near the start
+            f.seek(0)
+            if output_file is None:
+                with open(os.devnull, "wb") as output:
+                    translator.translate_json_stream(f, output, indent, target_lang, context, stats)
+                return True
+            fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(output_file) + ".", suffix=".tmp",
+                                             dir=os.path.dirname(output_file) or ".")
+            with os.fdopen(fd, "wb") as output:
+                translator.translate_json_stream(f, output, indent, target_lang, context, stats)
+        if (translator.quota_exceeded or translator.stop_requested) and stats.get("failed"):
+            return False                            # Incomplete translation, reported by the caller
+        os.replace(temp_file, output_file)
+        temp_file = None
+    except OSError as e:
+        print(f"❌ Error: Could not read '{input_file}' or write '{output_file}'. {e}")
+        return False
+    except ijson.JSONError as e:
+        print(f"❌ Error: Could not decode JSON in file '{input_file}'. {e}")
+        return False
+    except ValueError as e:
+        print(f"❌ Error: The file '{input_file}' could not be translated. {e}")
+        return False
+    finally:
+        if temp_file is not None and os.path.exists(temp_file):
+            os.remove(temp_file)                    # Keep an existing output file untouched on failure
+    return True
+
+def translate_json_directory(source_directory, target_lang="EN", context=None, requests_per_second=REQUESTS_PER_SECOND,
+                             emit_simulation_output=False, cache_file=CACHE_FILE):
 
     global simulate
 
     start_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
     print(f"✅ Starting at {start_time}")
     
-    translator = JSONTranslatorDeepL(get_api_key(), simulate)
+    translator = JSONTranslatorDeepL(get_api_key(), simulate, requests_per_second=requests_per_second, cache_file=cache_file)
 
     """ Translates all JSON files in the source directory and saves them in the target directory """
     if not translator.is_supported_target_language(target_lang):
@@ -185,80 +582,198 @@ def translate_json_directory(source_directory, target_lang="EN", context=None):
         
     parent_directory = "./" + os.path.relpath(os.path.join(source_directory, os.pardir))  # Parent directory
     target_directory = os.path.join(parent_directory, target_lang.lower())  # Target directory at the same level
+    write_output = not simulate or emit_simulation_output   # Simulated translations equal the source files
+
+    if write_output:
+        try:
+            os.makedirs(target_directory, exist_ok=True)  # Create target directory if it doesn't exist
+        except OSError as e:
+            print(f"❌ Error: Could not create target directory '{target_directory}'. {e}")
+            return
     
-    try:
-        os.makedirs(target_directory, exist_ok=True)  # Create target directory if it doesn't exist
-    except OSError as e:
-        print(f"❌ Error: Could not create target directory '{target_directory}'. {e}")
-        return
-    
-    total_word_count = 0
-    total_phrase_count = 0
-    file_count = 0
+    json_files = [filename for filename in os.listdir(source_directory) if filename.endswith(".json")]
+    worker_count = max(1, min(MAX_CONCURRENT_FILES, len(json_files)))
+    read_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)     # (input file, output file, data, indentation)
+    write_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)    # (input file, output file, translated data, indentation, stats)
+                                                              # data and translated data are None for streamed files
+    totals = {"files": 0, "words": 0, "phrases": 0, "failed": 0}
+    totals_lock = threading.Lock()
+    stop = threading.Event()                                  # Set on Ctrl+C to end all pipeline stages
 
-    for filename in os.listdir(source_directory):
-        if filename.endswith(".json"):
+    def put(pipeline_queue, item):
+        """ Puts an item into a pipeline queue, returns False if the run was stopped while waiting for space """
+        while not stop.is_set():
+            try:
+                pipeline_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(pipeline_queue):
+        """ Takes the next item from a pipeline queue, returns None if the run was stopped while waiting for one """
+        while not stop.is_set():
+            try:
+                return pipeline_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
 
+    def report_quota_failure(input_file):
+        """ Counts a file that could not be translated completely because the DeepL quota is exceeded """
+        print(f"\r❌ Error: DeepL quota exceeded, '{input_file}' was not translated and its output file was not written.")
+        with totals_lock:
+            totals["failed"] += 1
+
+    def read_files():
+        """ Producer reading the JSON files while earlier files are being translated """
+        for filename in json_files:
+            if stop.is_set():
+                return
             input_file = os.path.join(source_directory, filename)
             output_file = os.path.join(target_directory, filename)
+            if translator.quota_exceeded:           # Stop dispatching files, nothing more can be translated
+                report_quota_failure(input_file)
+                continue
+            try:
+                if os.path.getsize(input_file) >= STREAMING_THRESHOLD:
+                    put(read_queue, (input_file, output_file, None, None))  # Streamed by the translation worker
+                    continue
+            except OSError:
+                pass                                # Reported by read_json_file
+            loaded = read_json_file(input_file, detect_indent=write_output)
+            if loaded is not None:
+                put(read_queue, (input_file, output_file, *loaded))
+        for _ in range(worker_count):
+            put(read_queue, None)                   # One end marker per translation worker
 
+    def translate_files():
+        """ Translation worker consuming parsed files and passing the translations on to the writer """
+        while (item := get(read_queue)) is not None:
+            input_file, output_file, data, indent = item
+            stats = {"phrases": 0, "words": 0, "failed": 0}
             try:
-                with open(input_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            except OSError as e:
-                print(f"❌ Error: Could not read file '{input_file}'. {e}")
-                continue
-            except json.JSONDecodeError as e:
-                print(f"❌ Error: Could not decode JSON in file '{input_file}'. {e}")
-                continue
+                if data is None:                    # Large file, translated and written while being parsed
+                    succeeded = stream_translate_json_file(translator, input_file, output_file if write_output else None,
+                                                          target_lang, context, stats)
+                    translated_data = None
+                else:
+                    succeeded = True
+                    translated_data = translator.translate_dict(data, target_lang, context, stats)
             except Exception as e:
-                print(f"❌ Error: An unexpected error occurred while reading '{input_file}'. {e}")
+                if not stop.is_set():
+                    print(f"❌ Error: An unexpected error occurred while translating '{input_file}'. {e}")
+                continue
+            if stop.is_set():
+                return                              # Translation may be incomplete, do not write it
+            if translator.quota_exceeded and stats["failed"]:
+                report_quota_failure(input_file)    # Never overwrite a target with partly untranslated text
                 continue
-            if not isinstance(data, dict):
-                print(f"❌ Error: The file '{input_file}' does not contain a valid JSON object.")
+            if not succeeded:
                 continue
+            put(write_queue, (input_file, output_file, translated_data, indent, stats))
+        put(write_queue, None)
 
-            file_count += 1
-            translated_data = translator.translate_dict(data, target_lang, context)
+    def write_files():
+        """ Consumer writing the translated files until all translation workers have finished """
+        finished_workers = 0
+        while finished_workers < worker_count and not stop.is_set():
+            item = get(write_queue)
+            if item is None:
+                finished_workers += 1
+                continue
+            input_file, output_file, translated_data, indent, stats = item
+            totals["files"] += 1
             print(f"\r", end="", flush=True)
+            if write_output and translated_data is not None and not write_json_file(output_file, translated_data, indent):
+                continue                            # Streamed files (translated_data None) are already written
+            if write_output:
+                print(f"✅ Translated: {input_file} → {output_file} | Words: {stats['words']} | Phrases: {stats['phrases']}")
+            else:
+                print(f"✅ Simulated: {input_file} | Words: {stats['words']} | Phrases: {stats['phrases']}")
+            totals["words"] += stats["words"]
+            totals["phrases"] += stats["phrases"]
 
-            try:
-                with open(output_file, "w", encoding="utf-8") as f:
-                    json.dump(translated_data, f, ensure_ascii=False, indent=get_json_indentation(input_file))
-            except OSError as e:
-                print(f"❌ Error: Could not write to file '{output_file}'. {e}")
-                continue
-            
-            phrase_count, word_count = translator.count_words_and_phrases_in_dict(translated_data)
+    threads = [threading.Thread(target=read_files), threading.Thread(target=write_files)]
+    threads += [threading.Thread(target=translate_files) for _ in range(worker_count)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        translator.stop_requested = True
+        for thread in threads:
+            thread.join()                           # In-flight requests finish, nothing new is started
+        for pipeline_queue in (read_queue, write_queue):
+            while not pipeline_queue.empty():
+                pipeline_queue.get_nowait()         # Release the parsed and translated data not written
+        if translator.cache:
+            translator.cache.close()
+        print("\r❌ Translation aborted by the user, the remaining files were not written.")
+        sys.exit(130)
 
-            print(f"✅ Translated: {input_file} → {output_file} | Words: {word_count} | Phrases: {phrase_count}")
-            total_word_count += word_count
-            total_phrase_count += phrase_count
-    
-    if file_count == 0:
+    file_count = totals["files"]
+    total_word_count = totals["words"]
+    total_phrase_count = totals["phrases"]
+
+    if totals["failed"]:
+        print(f"❌ Error: DeepL quota exceeded, {totals['failed']} files were not translated.")
+    if file_count == 0 and not totals["failed"]:
         print("❌ Error: No JSON file found in the source directory.")
-    else:
+    elif file_count > 0:
         print(f"✅ Total count of characters: {translator.total_char_count} | Total count of words is {total_word_count} | Total count of phrases is {total_phrase_count} | Files: {file_count}")
+    if translator.cache:
+        translator.cache.close()
     end_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
     print(f"✅ Finishing at {end_time}")
 
 
 # Set the simulation mode to True for testing
 simulate = True
+last_progress_time = 0.0
 
 if __name__ == "__main__":
+    requests_per_second = REQUESTS_PER_SECOND
+    emit_simulation_output = False
+    cache_file = CACHE_FILE
     if sys.gettrace():  # Check if running in debugger
         source_directory = "./Translations/en"
         target_language_code = "DE"
         context = "The context of the translation is a software application for the railway industry."
     else:
-        if len(sys.argv) < 3 or len(sys.argv) > 4:
+        args = sys.argv[1:]
+        emit_simulation_output = "--emit-simulation-output" in args
+        if emit_simulation_output:
+            args.remove("--emit-simulation-output")
+        if "--no-cache" in args:
+            args.remove("--no-cache")
+            cache_file = None
+        try:
+            cache_option = pop_option(args, "--cache")
+            if cache_option is not None:
+                cache_file = cache_option if cache_file else None   # --no-cache wins over --cache
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        try:
+            rate = pop_option(args, "--rate")
+            if rate is not None:
+                requests_per_second = float(rate)
+            if not math.isfinite(requests_per_second) or requests_per_second <= 0:
+                raise ValueError(f"Invalid rate '{rate}'")
+        except ValueError as e:
+            print(f"❌ Error: --rate must be a positive number of requests per second. {e}")
+            sys.exit(1)
+        if len(args) < 2 or len(args) > 3:
             print("❌ Error: Please enter the source directory and the language code!")
-            print("💡 Usage: python3 translate_json_with_deepl.py <source_directory> <target_language_code> [<context string>]")
+            print("💡 Usage: python3 translate_json_with_deepl.py <source_directory> <target_language_code> [<context string>] [--rate <requests per second>] [--cache <file> | --no-cache] [--emit-simulation-output]")
             sys.exit(1)
         else:
-            source_directory = sys.argv[1]
-            target_language_code = sys.argv[2]
-            context = sys.argv[3] if len(sys.argv) == 4 else None
+            source_directory = args[0]
+            target_language_code = args[1]
+            context = args[2] if len(args) == 3 else None
 
-    translate_json_directory(source_directory, target_language_code, context=context)
+    translate_json_directory(source_directory, target_language_code, context=context, requests_per_second=requests_per_second,
+                             emit_simulation_output=emit_simulation_output, cache_file=cache_file)